@@ -1,14 +1,117 @@
 """BestRAG"""
 # Authors: Abdul Samad Siddiqui <abdulsamadsid1@gmail.com>
 
+import asyncio
+import hashlib
+import os
 import re
-import uuid
-from typing import List, Optional
-from qdrant_client import QdrantClient, models
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from itertools import count, islice
+from typing import Iterator, List, Optional
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
 from qdrant_client.http.models import Distance
 from fastembed import TextEmbedding
 from fastembed.sparse.bm25 import Bm25
-import PyPDF2
+import fitz
+
+EMBED_BATCH_SIZE = int(os.getenv("BESTRAG_EMBED_BATCH_SIZE", "32"))
+UPSERT_BATCH_SIZE = int(os.getenv("BESTRAG_UPSERT_BATCH_SIZE", "32"))
+UPSERT_MAX_WORKERS = 4
+ASYNC_UPSERT_CONCURRENCY = 2
+EXTRACT_MAX_WORKERS = min(os.cpu_count() or 1, 4)
+EMBED_CACHE_SIZE = 1024
+INDEXING_THRESHOLD = 20000
+PAGE_QUEUE_SIZE = 8
+POINT_QUEUE_SIZE = 4
+
+_RE_MULTISPACE = re.compile(r'\s{2,}')
+_RE_NUMBERED = re.compile(r'(\d+\.)\s')
+_RE_BULLETS = re.compile(r'[●■○]')
+_RE_QUOTES = re.compile(r'[""''«»]')
+_RE_DASHES = re.compile(r'[–—−]')
+_RE_NON_ASCII = re.compile(r'[^\x00-\x7F]+')
+_RE_ZERO_WIDTH = re.compile(r'[\u200B-\u200D\uFEFF]')
+_RE_WHITESPACE = re.compile(r'\s+')
+
+_PATTERNS = (
+    (_RE_MULTISPACE, ' '),
+    (_RE_NUMBERED, r'\n\1 '),
+    (_RE_BULLETS, ''),
+    (_RE_QUOTES, '"'),
+    (_RE_DASHES, '-'),
+    (_RE_NON_ASCII, ''),
+    (_RE_ZERO_WIDTH, ''),
+    (_RE_WHITESPACE, ' '),
+)
+
+_PAGE_SEP = '\x00'
+
+_TRANS = str.maketrans({'_': None, '\n': ' '})
+
+
+def _onnx_providers(device: str):
+    """
+    Build the ONNX execution provider list for the given device.
+
+    Args:
+        device (str): "cpu" or "cuda".
+
+    Returns:
+        Optional[list]: The provider list, or None for the default (CPU).
+    """
+    if device == "cuda":
+        return [("CUDAExecutionProvider", {"device_id": 0}),
+                "CPUExecutionProvider"]
+    return None
+
+
+@lru_cache(maxsize=None)
+def _dense_model(device: str = "cpu") -> TextEmbedding:
+    """
+    Return the process-wide dense embedding model, loading it on first use.
+    """
+    return TextEmbedding(providers=_onnx_providers(device))
+
+
+@lru_cache(maxsize=None)
+def _late_interaction_model(model_name: str, device: str = "cpu") -> TextEmbedding:
+    """
+    Return the process-wide late interaction model for the given name,
+    loading it on first use.
+    """
+    return TextEmbedding(model_name, providers=_onnx_providers(device))
+
+
+@lru_cache(maxsize=None)
+def _sparse_model() -> Bm25:
+    """
+    Return the process-wide sparse embedding model, loading it on first use.
+    """
+    return Bm25("Qdrant/bm25")
+
+
+def _extract_one_page(pdf_path: str, page_num: int) -> str:
+    """
+    Extract the text of a single page of a PDF file.
+
+    Module-level so it can be pickled into worker processes.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        page_num (int): The zero-based page index to extract.
+
+    Returns:
+        str: The text of the page.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        return doc[page_num].get_text("text")
+    finally:
+        doc.close()
 
 
 class BestRAG:
@@ -26,23 +129,32 @@ class BestRAG:
         collection_name (str): The name of the Qdrant collection to use.
         late_interaction_model_name (Optional[str]): The name of the late
             interaction model to use. Defaults to "BAAI/bge-small-en-v1.5".
+        device (str): The device to run the embedding models on, "cpu" or
+            "cuda". Defaults to "cpu".
     """
 
     def __init__(self,
                  url: str,
                  api_key: str,
                  collection_name: str,
-                 late_interaction_model_name: Optional[str] = "BAAI/bge-small-en-v1.5"
+                 late_interaction_model_name: Optional[str] = "BAAI/bge-small-en-v1.5",
+                 device: str = "cpu"
                  ):
         self.collection_name = collection_name
         self.api_key = api_key
         self.url = url
+        self.device = device
         self.client = QdrantClient(url=url, api_key=api_key)
+        self.aclient = AsyncQdrantClient(url=url, api_key=api_key)
 
-        self.dense_model = TextEmbedding()
-        self.late_interaction_model = TextEmbedding(
-            late_interaction_model_name)
-        self.sparse_model = Bm25("Qdrant/bm25")
+        self.dense_model = _dense_model(device)
+        self.late_interaction_model = _late_interaction_model(
+            late_interaction_model_name, device)
+        self.sparse_model = _sparse_model()
+        self._embed_cache = OrderedDict()
+        self._id_counter = count(
+            start=((os.getpid() & 0xFFFFF) << 44)
+            | (int(time.time() * 1000) & ((1 << 44) - 1)))
 
         self._create_or_use_collection()
 
@@ -50,24 +162,28 @@ class BestRAG:
         """
         Create a new Qdrant collection if it doesn't exist, or use an existing one.
         """
-        collections = self.client.get_collections()
-        collection_names = [
-            collection.name for collection in collections.collections]
-
-        if self.collection_name not in collection_names:
+        if not self.client.collection_exists(self.collection_name):
+            quantization_config = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    always_ram=True
+                )
+            )
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config={
                     "dense-vector": models.VectorParams(
                         size=384,
-                        distance=Distance.COSINE
+                        distance=Distance.COSINE,
+                        quantization_config=quantization_config
                     ),
                     "output-token-embeddings": models.VectorParams(
                         size=384,
                         distance=Distance.COSINE,
                         multivector_config=models.MultiVectorConfig(
                             comparator=models.MultiVectorComparator.MAX_SIM
-                        )
+                        ),
+                        quantization_config=quantization_config
                     ),
                 },
                 sparse_vectors_config={"sparse": models.SparseVectorParams()}
@@ -86,19 +202,108 @@ class BestRAG:
         Returns:
             str: The cleaned text.
         """
-        text = re.sub(r'_+', '', text)
-        text = text.replace('\n', ' ')
-        text = re.sub(r'\s{2,}', ' ', text)
-        text = re.sub(r'(\d+\.)\s', r'\n\1 ', text)
-        text = re.sub(r'[●■○]', '', text)
-        text = re.sub(r'[""''«»]', '"', text)
-        text = re.sub(r'[–—−]', '-', text)
-        text = re.sub(r'[^\x00-\x7F]+', '', text)
-        text = re.sub(r'[\u200B-\u200D\uFEFF]', '', text)
-        text = re.sub(r'\s+', ' ', text)
+        text = text.translate(_TRANS)
+        for pattern, replacement in _PATTERNS:
+            text = pattern.sub(replacement, text)
 
         return text.strip()
 
+    def _clean_texts(self, texts: List[str]) -> List[str]:
+        """
+        Clean a batch of texts in a single pass per pattern.
+
+        The texts are joined with a sentinel character so each regex scans
+        one buffer instead of being invoked once per text, then split back
+        apart. The sentinel is ASCII and non-whitespace, so every cleanup
+        pattern leaves it intact.
+
+        Args:
+            texts (List[str]): The texts to be cleaned.
+
+        Returns:
+            List[str]: The cleaned texts, aligned with the input.
+        """
+        if not texts:
+            return []
+
+        joined = _PAGE_SEP.join(
+            text.replace(_PAGE_SEP, ' ') for text in texts)
+        joined = joined.translate(_TRANS)
+        for pattern, replacement in _PATTERNS:
+            joined = pattern.sub(replacement, joined)
+
+        return [text.strip() for text in joined.split(_PAGE_SEP)]
+
+    @staticmethod
+    def _cache_key(kind: str, text: str):
+        """
+        Build the cache key for an embedding of the given kind and text.
+
+        Args:
+            kind (str): The embedding kind ("dense", "late" or "sparse").
+            text (str): The cleaned text to be embedded.
+
+        Returns:
+            tuple: A (kind, digest) pair usable as a dict key.
+        """
+        digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        return (kind, digest)
+
+    def _cache_lookup(self, kind: str, text: str):
+        """
+        Return the cached embedding for the given text, or None on a miss.
+
+        Args:
+            kind (str): The embedding kind.
+            text (str): The cleaned text to look up.
+
+        Returns:
+            The cached embedding, or None.
+        """
+        key = self._cache_key(kind, text)
+        embedding = self._embed_cache.get(key)
+        if embedding is not None:
+            self._embed_cache.move_to_end(key)
+        return embedding
+
+    def _cache_store(self, kind: str, text: str, embedding):
+        """
+        Store an embedding in the cache, evicting the least recently used
+        entry once EMBED_CACHE_SIZE is reached.
+
+        Args:
+            kind (str): The embedding kind.
+            text (str): The cleaned text that was embedded.
+            embedding: The embedding to cache.
+        """
+        self._embed_cache[self._cache_key(kind, text)] = embedding
+        if len(self._embed_cache) > EMBED_CACHE_SIZE:
+            self._embed_cache.popitem(last=False)
+
+    def _embed_batch(self, kind: str, embed_fn, texts: List[str]) -> list:
+        """
+        Embed a batch of texts, reusing cached embeddings and running the
+        model only for cache misses.
+
+        Args:
+            kind (str): The embedding kind, used to key the cache.
+            embed_fn: The model's embed method.
+            texts (List[str]): The cleaned texts to embed.
+
+        Returns:
+            list: The embeddings, aligned with the input texts.
+        """
+        embeddings = [self._cache_lookup(kind, text) for text in texts]
+        misses = [i for i, embedding in enumerate(embeddings)
+                  if embedding is None]
+        if misses:
+            computed = list(embed_fn([texts[i] for i in misses],
+                                     batch_size=EMBED_BATCH_SIZE))
+            for i, embedding in zip(misses, computed):
+                self._cache_store(kind, texts[i], embedding)
+                embeddings[i] = embedding
+        return embeddings
+
     def _get_dense_embedding(self, text: str):
         """
         Get the dense embedding for the given text.
@@ -109,7 +314,11 @@ class BestRAG:
         Returns:
             List[float]: The dense embedding vector.
         """
-        return list(self.dense_model.embed([text]))[0]
+        embedding = self._cache_lookup("dense", text)
+        if embedding is None:
+            embedding = next(iter(self.dense_model.embed([text])))
+            self._cache_store("dense", text, embedding)
+        return embedding
 
     def _get_late_interaction_embedding(self, text: str):
         """
@@ -121,7 +330,11 @@ class BestRAG:
         Returns:
             List[float]: The late interaction embedding vector.
         """
-        return list(self.late_interaction_model.embed([text]))[0]
+        embedding = self._cache_lookup("late", text)
+        if embedding is None:
+            embedding = next(iter(self.late_interaction_model.embed([text])))
+            self._cache_store("late", text, embedding)
+        return embedding
 
     def _get_sparse_embedding(self, text: str):
         """
@@ -133,72 +346,277 @@ class BestRAG:
         Returns:
             models.SparseVector: The sparse embedding vector.
         """
-        return next(self.sparse_model.embed(text))
+        embedding = self._cache_lookup("sparse", text)
+        if embedding is None:
+            embedding = next(iter(self.sparse_model.embed([text])))
+            self._cache_store("sparse", text, embedding)
+        return embedding
 
-    def _extract_pdf_text_per_page(self, pdf_path: str) -> List[str]:
+    def _iter_pdf_pages(self, pdf_path: str) -> Iterator[str]:
         """
-        Load a PDF file and extract the text from each page.
+        Load a PDF file and yield the text of each page in order.
+
+        Pages are extracted in parallel worker processes, which keeps the
+        CPU-bound text decoding off the GIL, and streamed to the caller so
+        only a window of page text is held in memory at a time.
 
         Args:
             pdf_path (str): The path to the PDF file.
 
-        Returns:
-            List[str]: The text from each page of the PDF.
+        Yields:
+            str: The text of each page of the PDF.
         """
-        with open(pdf_path, "rb") as pdf_file:
-            reader = PyPDF2.PdfReader(pdf_file)
-            return [page.extract_text() for page in reader.pages]
-
-    def store_pdf_embeddings(self, pdf_path: str,
-                             pdf_name: str,
-                             metadata: Optional[dict] = None):
+        doc = fitz.open(pdf_path)
+        n_pages = doc.page_count
+        doc.close()
+
+        with ProcessPoolExecutor(max_workers=EXTRACT_MAX_WORKERS) as executor:
+            yield from executor.map(
+                partial(_extract_one_page, pdf_path), range(n_pages))
+
+    def _iter_point_batches(self, pdf_path: str,
+                            pdf_name: str,
+                            metadata: Optional[dict] = None
+                            ) -> Iterator[List[models.PointStruct]]:
         """
-        Store the embeddings for each page of a PDF file in the Qdrant collection.
+        Extract, clean and embed the pages of a PDF in fixed-size windows
+        and yield the points to upsert into the Qdrant collection.
+
+        Pages stream from _iter_pdf_pages, so only UPSERT_BATCH_SIZE pages
+        of text and embeddings are materialized at a time.
 
         Args:
             pdf_path (str): The path to the PDF file.
             pdf_name (str): The name of the PDF file.
             metadata (Optional[dict]): Additional metadata to store with each embedding.
+
+        Yields:
+            List[models.PointStruct]: One point per page, in batches.
         """
-        texts = self._extract_pdf_text_per_page(pdf_path)
+        pages = self._iter_pdf_pages(pdf_path)
+        page_num = 0
+
+        while True:
+            window = list(islice(pages, UPSERT_BATCH_SIZE))
+            if not window:
+                break
+
+            clean_texts = self._clean_texts(window)
+            yield self._build_window_points(
+                clean_texts, pdf_name, metadata, page_num)
+            page_num += len(window)
 
-        for page_num, text in enumerate(texts):
-            clean_text = self._clean_text(text)
-            dense_embedding = self._get_dense_embedding(clean_text)
-            late_interaction_embedding = self._get_late_interaction_embedding(
-                clean_text)
-            sparse_embedding = self._get_sparse_embedding(clean_text)
+    def _build_window_points(self, clean_texts: List[str],
+                             pdf_name: str,
+                             metadata: Optional[dict],
+                             start_page: int) -> List[models.PointStruct]:
+        """
+        Embed one window of cleaned page texts and build their points.
+
+        Args:
+            clean_texts (List[str]): The cleaned page texts of the window.
+            pdf_name (str): The name of the PDF file.
+            metadata (Optional[dict]): Additional metadata to store with each embedding.
+            start_page (int): The zero-based index of the window's first page.
+
+        Returns:
+            List[models.PointStruct]: One point per page of the window.
+        """
+        dense_embeddings = self._embed_batch(
+            "dense", self.dense_model.embed, clean_texts)
+        late_interaction_embeddings = self._embed_batch(
+            "late", self.late_interaction_model.embed, clean_texts)
+        sparse_embeddings = self._embed_batch(
+            "sparse", self.sparse_model.embed, clean_texts)
+
+        points = []
+        for offset, clean_text in enumerate(clean_texts):
+            dense_embedding = dense_embeddings[offset]
+            late_interaction_embedding = late_interaction_embeddings[offset]
+            sparse_embedding = sparse_embeddings[offset]
 
             hybrid_vector = {
-                "dense-vector": dense_embedding,
-                "output-token-embeddings": late_interaction_embedding,
+                "dense-vector": np.asarray(
+                    dense_embedding, dtype=np.float32),
+                "output-token-embeddings": np.asarray(
+                    late_interaction_embedding, dtype=np.float32),
                 "sparse": models.SparseVector(
-                    indices=sparse_embedding.indices,
-                    values=sparse_embedding.values,
+                    indices=sparse_embedding.indices.tolist(),
+                    values=sparse_embedding.values.tolist(),
                 )
             }
 
             payload = {
                 "text": clean_text,
-                "page_number": page_num + 1,
+                "page_number": start_page + offset + 1,
                 "pdf_name": pdf_name
             }
 
             if metadata:
                 payload.update(metadata)
 
-            point = models.PointStruct(
-                id=str(uuid.uuid4()),
+            points.append(models.PointStruct(
+                id=next(self._id_counter),
                 vector=hybrid_vector,
                 payload=payload
+            ))
+
+        return points
+
+    def _set_indexing_threshold(self, threshold: int):
+        """
+        Update the collection's indexing threshold.
+
+        Setting it to 0 disables HNSW index building, which speeds up bulk
+        uploads; restoring it re-enables indexing.
+
+        Args:
+            threshold (int): The indexing threshold to set.
+        """
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            optimizer_config=models.OptimizersConfigDiff(
+                indexing_threshold=threshold
             )
+        )
+
+    def store_pdf_embeddings(self, pdf_path: str,
+                             pdf_name: str,
+                             metadata: Optional[dict] = None,
+                             bulk: bool = False):
+        """
+        Store the embeddings for each page of a PDF file in the Qdrant collection.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+            pdf_name (str): The name of the PDF file.
+            metadata (Optional[dict]): Additional metadata to store with each embedding.
+            bulk (bool): Disable HNSW indexing while uploading and restore
+                it afterwards. Speeds up ingestion of large PDFs.
+        """
+        if bulk:
+            self._set_indexing_threshold(0)
+        try:
+            n_pages = self._upsert_points(
+                self._iter_point_batches(pdf_path, pdf_name, metadata))
+        finally:
+            if bulk:
+                self._set_indexing_threshold(INDEXING_THRESHOLD)
+
+        print(f"Stored embeddings for {n_pages} pages of '{pdf_name}' in collection '{self.collection_name}'.")
+
+    async def astore_pdf_embeddings(self, pdf_path: str,
+                                    pdf_name: str,
+                                    metadata: Optional[dict] = None,
+                                    bulk: bool = False):
+        """
+        Asynchronous variant of store_pdf_embeddings.
+
+        Extraction, embedding and upload run as three pipeline stages
+        connected by bounded queues, so the I/O-bound page reads, the
+        CPU-bound embedding and the network-bound upserts overlap instead
+        of running back to back. At most ASYNC_UPSERT_CONCURRENCY upsert
+        requests are in flight at once.
 
-            self.client.upsert(
+        Args:
+            pdf_path (str): The path to the PDF file.
+            pdf_name (str): The name of the PDF file.
+            metadata (Optional[dict]): Additional metadata to store with each embedding.
+            bulk (bool): Disable HNSW indexing while uploading and restore
+                it afterwards. Speeds up ingestion of large PDFs.
+        """
+        loop = asyncio.get_running_loop()
+        page_queue = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+        point_queue = asyncio.Queue(maxsize=POINT_QUEUE_SIZE)
+
+        pages = self._iter_pdf_pages(pdf_path)
+
+        def next_window():
+            return list(islice(pages, UPSERT_BATCH_SIZE))
+
+        async def producer():
+            while True:
+                window = await loop.run_in_executor(None, next_window)
+                if not window:
+                    break
+                await page_queue.put(self._clean_texts(window))
+            await page_queue.put(None)
+
+        async def embedder():
+            start_page = 0
+            while True:
+                clean_texts = await page_queue.get()
+                if clean_texts is None:
+                    break
+                points = await loop.run_in_executor(
+                    None, self._build_window_points,
+                    clean_texts, pdf_name, metadata, start_page)
+                start_page += len(clean_texts)
+                await point_queue.put(points)
+            await point_queue.put(None)
+
+        async def upsert_batch(batch):
+            await self.aclient.upsert(
                 collection_name=self.collection_name,
-                points=[point]
+                points=batch,
+                wait=False
             )
 
-            print(f"Stored embedding for page {page_num + 1} of '{pdf_name}' in collection '{self.collection_name}'.")
+        async def uploader():
+            n_points = 0
+            uploads = []
+            while True:
+                points = await point_queue.get()
+                if points is None:
+                    break
+                n_points += len(points)
+                if len(uploads) >= ASYNC_UPSERT_CONCURRENCY:
+                    await uploads.pop(0)
+                uploads.append(asyncio.ensure_future(upsert_batch(points)))
+            await asyncio.gather(*uploads)
+            return n_points
+
+        if bulk:
+            self._set_indexing_threshold(0)
+        try:
+            _, _, n_pages = await asyncio.gather(
+                producer(), embedder(), uploader())
+        finally:
+            if bulk:
+                self._set_indexing_threshold(INDEXING_THRESHOLD)
+
+        print(f"Stored embeddings for {n_pages} pages of '{pdf_name}' in collection '{self.collection_name}'.")
+
+    def _upsert_points(self, point_batches: Iterator[List[models.PointStruct]]) -> int:
+        """
+        Upsert batches of points into the Qdrant collection.
+
+        Batches are sent concurrently as they are produced, so network
+        round-trips overlap with server-side writes.
+
+        Args:
+            point_batches (Iterator[List[models.PointStruct]]): The batches
+                of points to upsert.
+
+        Returns:
+            int: The total number of points upserted.
+        """
+        n_points = 0
+
+        with ThreadPoolExecutor(max_workers=UPSERT_MAX_WORKERS) as executor:
+            futures = []
+            for batch in point_batches:
+                n_points += len(batch)
+                futures.append(executor.submit(
+                    self.client.upsert,
+                    collection_name=self.collection_name,
+                    points=batch,
+                    wait=False
+                ))
+            for future in futures:
+                future.result()
+
+        return n_points
 
     def delete_pdf_embeddings(self, pdf_name: str):
         """
@@ -229,6 +647,10 @@ class BestRAG:
         """
         Search the Qdrant collection for documents that match the given query.
 
+        Dense and sparse retrieval run as parallel prefetch branches inside
+        a single server-side query, and the late interaction model reranks
+        the merged candidates.
+
         Args:
             query (str): The search query.
             limit (int): The maximum number of results to return. Defaults to 10.
@@ -242,25 +664,24 @@ class BestRAG:
             clean_query)
         sparse_query = self._get_sparse_embedding(clean_query)
 
-        query_vector = {
-            "dense-vector": dense_query,
-            "output-token-embeddings": late_interaction_query,
-            "sparse": {
-                "indices": sparse_query.indices,
-                "values": sparse_query.values,
-            }
-        }
-
         results = self.client.query_points(
             collection_name=self.collection_name,
             prefetch=[
                 models.Prefetch(
-                    query=query_vector["dense-vector"],
+                    query=dense_query,
                     using="dense-vector",
                     limit=20,
-                )
+                ),
+                models.Prefetch(
+                    query=models.SparseVector(
+                        indices=sparse_query.indices.tolist(),
+                        values=sparse_query.values.tolist(),
+                    ),
+                    using="sparse",
+                    limit=20,
+                ),
             ],
-            query=query_vector["output-token-embeddings"],
+            query=late_interaction_query,
             using="output-token-embeddings",
             limit=limit,
         )
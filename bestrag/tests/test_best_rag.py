@@ -1,5 +1,8 @@
+import asyncio
+
+import numpy as np
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from bestrag.best_rag import BestRAG
 
 url = "http://localhost:6333"
@@ -8,12 +11,12 @@ collection_name = "test_collection"
 
 
 @pytest.fixture
+@patch("bestrag.best_rag.AsyncQdrantClient")
 @patch("bestrag.best_rag.QdrantClient")
-def best_rag_instance(mock_qdrant_client):
+def best_rag_instance(mock_qdrant_client, mock_async_qdrant_client):
     """Fixture to create a BestRAG instance for testing with mocked QdrantClient."""
     mock_qdrant_client_instance = mock_qdrant_client.return_value
-    mock_qdrant_client_instance.get_collections.return_value = MagicMock(
-        collections=[])
+    mock_qdrant_client_instance.collection_exists.return_value = False
     mock_qdrant_client_instance.create_collection.return_value = None
     mock_qdrant_client_instance.upsert.return_value = None
     mock_qdrant_client_instance.query_points.return_value = [
@@ -24,13 +27,13 @@ def best_rag_instance(mock_qdrant_client):
 
 def test_create_or_use_collection(best_rag_instance):
     """Test collection creation or selection."""
-    with patch.object(best_rag_instance.client, 'get_collections',
-                      return_value=MagicMock(collections=[])) as mock_get_collections, \
+    with patch.object(best_rag_instance.client, 'collection_exists',
+                      return_value=False) as mock_collection_exists, \
             patch.object(best_rag_instance.client, 'create_collection',
                          return_value=None) as mock_create_collection:
 
         best_rag_instance._create_or_use_collection()
-        mock_get_collections.assert_called_once()
+        mock_collection_exists.assert_called_once_with("test_collection")
         mock_create_collection.assert_called_once()
 
 
@@ -41,6 +44,15 @@ def test_clean_text(best_rag_instance):
     assert best_rag_instance._clean_text(raw_text) == expected_cleaned_text
 
 
+def test_clean_texts(best_rag_instance):
+    """Test batched text cleaning matches the single-text path."""
+    raw_texts = ["This is _an example_ text.\nNew line with    multiple spaces.",
+                 "Second page   with _underscores_."]
+    expected = [best_rag_instance._clean_text(text) for text in raw_texts]
+    assert best_rag_instance._clean_texts(raw_texts) == expected
+    assert best_rag_instance._clean_texts([]) == []
+
+
 def test_get_dense_embedding(best_rag_instance):
     """Test dense embedding generation."""
     with patch.object(best_rag_instance.dense_model, 'embed',
@@ -50,6 +62,16 @@ def test_get_dense_embedding(best_rag_instance):
         assert len(result) == 3
 
 
+def test_embedding_cache(best_rag_instance):
+    """Test that repeated texts do not re-run the embedding model."""
+    with patch.object(best_rag_instance.dense_model, 'embed',
+                      return_value=[[0.1, 0.2, 0.3]]) as mock_embed:
+        first = best_rag_instance._get_dense_embedding("Repeated text")
+        second = best_rag_instance._get_dense_embedding("Repeated text")
+        mock_embed.assert_called_once()
+        assert first is second
+
+
 def test_get_late_interaction_embedding(best_rag_instance):
     """Test late interaction embedding generation."""
     with patch.object(best_rag_instance.late_interaction_model, 'embed',
@@ -71,19 +93,26 @@ def test_get_sparse_embedding(best_rag_instance):
         assert result.values == [0.1, 0.2]
 
 
-def test_extract_pdf_text_per_page(best_rag_instance, tmp_path):
-    """Test PDF text extraction per page."""
+def test_iter_pdf_pages(best_rag_instance, tmp_path):
+    """Test streaming PDF text extraction per page."""
     pdf_path = tmp_path / "sample.pdf"
     pdf_path.write_bytes(b'%PDF-1.4...')
 
-    with patch("PyPDF2.PdfReader") as mock_pdf_reader:
-        mock_reader_instance = MagicMock()
-        mock_pdf_reader.return_value = mock_reader_instance
-        mock_reader_instance.pages = [MagicMock(extract_text=lambda: "Page 1 text"),
-                                      MagicMock(extract_text=lambda: "Page 2 text")]
-
-        extracted_text = best_rag_instance._extract_pdf_text_per_page(
-            str(pdf_path))
+    mock_executor = MagicMock()
+    mock_executor.__enter__.return_value.map.side_effect = \
+        lambda fn, iterable: [fn(i) for i in iterable]
+
+    with patch("bestrag.best_rag.fitz.open") as mock_fitz_open, \
+            patch("bestrag.best_rag.ProcessPoolExecutor",
+                  return_value=mock_executor):
+        mock_doc = MagicMock()
+        mock_fitz_open.return_value = mock_doc
+        mock_doc.page_count = 2
+        pages = [MagicMock(get_text=lambda kind: "Page 1 text"),
+                 MagicMock(get_text=lambda kind: "Page 2 text")]
+        mock_doc.__getitem__.side_effect = lambda i: pages[i]
+
+        extracted_text = list(best_rag_instance._iter_pdf_pages(str(pdf_path)))
         assert extracted_text == ["Page 1 text", "Page 2 text"]
 
 
@@ -92,19 +121,39 @@ def test_store_pdf_embeddings(best_rag_instance, tmp_path):
     pdf_path = tmp_path / "sample.pdf"
     pdf_path.write_bytes(b'%PDF-1.4...')
 
-    with patch.object(best_rag_instance, '_extract_pdf_text_per_page',
-                      return_value=["Page 1 text", "Page 2 text"]), \
-            patch.object(best_rag_instance, '_get_dense_embedding',
-                         return_value=[0.1, 0.2, 0.3]), \
-            patch.object(best_rag_instance, '_get_late_interaction_embedding',
-                         return_value=[0.4, 0.5, 0.6]), \
-            patch.object(best_rag_instance, '_get_sparse_embedding',
-                         return_value=MagicMock(indices=[1, 2], values=[0.1, 0.2])), \
+    with patch.object(best_rag_instance, '_iter_pdf_pages',
+                      return_value=iter(["Page 1 text", "Page 2 text"])), \
+            patch.object(best_rag_instance.dense_model, 'embed',
+                         return_value=iter([[0.1, 0.2, 0.3]] * 2)), \
+            patch.object(best_rag_instance.late_interaction_model, 'embed',
+                         return_value=iter([[0.4, 0.5, 0.6]] * 2)), \
+            patch.object(best_rag_instance.sparse_model, 'embed',
+                         return_value=iter([MagicMock(indices=np.array([1, 2]),
+                                                      values=np.array([0.1, 0.2]))] * 2)), \
             patch.object(best_rag_instance.client, 'upsert',
                          return_value=None) as mock_upsert:
 
         best_rag_instance.store_pdf_embeddings(str(pdf_path), "sample.pdf")
-        assert mock_upsert.call_count == 2
+        mock_upsert.assert_called_once()
+        assert len(mock_upsert.call_args.kwargs["points"]) == 2
+
+
+def test_astore_pdf_embeddings(best_rag_instance, tmp_path):
+    """Test storing PDF embeddings through the async client."""
+    pdf_path = tmp_path / "sample.pdf"
+    pdf_path.write_bytes(b'%PDF-1.4...')
+
+    with patch.object(best_rag_instance, '_iter_pdf_pages',
+                      return_value=iter(["Page 1 text", "Page 2 text"])), \
+            patch.object(best_rag_instance, '_build_window_points',
+                         return_value=[MagicMock(), MagicMock()]), \
+            patch.object(best_rag_instance.aclient, 'upsert',
+                         new_callable=AsyncMock) as mock_upsert:
+
+        asyncio.run(best_rag_instance.astore_pdf_embeddings(
+            str(pdf_path), "sample.pdf"))
+        mock_upsert.assert_awaited_once()
+        assert len(mock_upsert.call_args.kwargs["points"]) == 2
 
 
 def test_search(best_rag_instance):
@@ -114,7 +163,8 @@ def test_search(best_rag_instance):
             patch.object(best_rag_instance, '_get_late_interaction_embedding',
                          return_value=[0.4, 0.5, 0.6]), \
             patch.object(best_rag_instance, '_get_sparse_embedding',
-                         return_value=MagicMock(indices=[1, 2], values=[0.1, 0.2])), \
+                         return_value=MagicMock(indices=np.array([1, 2]),
+                                                values=np.array([0.1, 0.2]))), \
             patch.object(best_rag_instance.client, 'query_points',
                          return_value=[{"payload": {"text": "Relevant document"}}]) as mock_query:
 
@@ -15,7 +15,7 @@ setup(
     packages=find_packages(),
     install_requires=[
         "fastembed==0.4.1",
-        "PyPDF2==3.0.1",
+        "pymupdf",
         "qdrant-client",
         "onnxruntime==1.19.2",
     ],